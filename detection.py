@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Renderização das páginas do PDF e detecção de partituras.
+Depende apenas do OpenCV, NumPy e PDFium, sem o restante do pipeline de áudio.
+"""
+
+import cv2
+import numpy as np
+import pypdfium2.raw as pdfium_c
+from concurrent.futures import ThreadPoolExecutor
+
+# Elemento estruturante da detecção de pautas, calculado uma única vez.
+# O kernel original (25 x 1 a 200 DPI, página de ~1700 px) equivale a ~8 px na
+# miniatura de 600 px; as duas iterações da abertura fundem-se em 2 * 8 - 1 = 15.
+_HKERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1))
+
+# Resoluções de renderização: baixa para a detecção de pautas, alta para o Audiveris
+DETECTION_DPI = 150
+OMR_DPI = 300
+
+# Largura (em pixels) usada na detecção de pautas
+DETECTION_WIDTH = 600
+
+# Teto do limiar de Otsu: em páginas de baixo contraste (em branco, com fundo em
+# degradê ou faixas sombreadas) o Otsu separaria tons de fundo e marcaria como
+# "tinta" faixas inteiras da página.
+OTSU_MAX_THRESHOLD = 180
+
+def render_page(page, dpi=200):
+    """
+    Renderiza uma página do PDF diretamente em memória com o PDFium,
+    retornando a imagem em tons de cinza como um array NumPy.
+    """
+    bitmap = page.render(
+        scale=dpi / 72,
+        rev_byteorder=True,
+        force_bitmap_format=pdfium_c.FPDFBitmap_BGRA,
+    )
+    # Com rev_byteorder o bitmap já vem em RGBA, sem necessidade de reordenar canais
+    return cv2.cvtColor(bitmap.to_numpy(), cv2.COLOR_RGBA2GRAY)
+
+def _detect_lines(thresh):
+    """
+    Isola as linhas horizontais de uma página binarizada.
+    """
+    return cv2.morphologyEx(thresh, cv2.MORPH_OPEN, _HKERNEL)
+
+def detect_sheet_music(images):
+    """
+    Versão em lote de is_sheet_music: recebe uma lista de imagens em tons de
+    cinza e retorna, para cada uma, se possui características de partitura.
+    """
+    if not images:
+        return []
+    # Reduz as imagens para 600 px de largura, para que a morfologia opere
+    # sobre ~16x menos pixels.
+    thumbnails = [
+        cv2.resize(
+            image,
+            (DETECTION_WIDTH, max(1, int(image.shape[0] * DETECTION_WIDTH / image.shape[1]))),
+            interpolation=cv2.INTER_AREA,
+        )
+        for image in images
+    ]
+    heights = np.array([thumb.shape[0] for thumb in thumbnails])
+
+    # A redução por média de área transforma linhas finas (~1 px) em cinza claro,
+    # que um limiar fixo de 127 descartaria; por isso cada miniatura é binarizada
+    # com o limiar de Otsu, limitado a OTSU_MAX_THRESHOLD. As páginas são empilhadas
+    # em um único tensor (N, H, W), completando as mais curtas com fundo (0).
+    thresh = np.zeros((len(thumbnails), heights.max(), DETECTION_WIDTH), dtype=np.uint8)
+    for k, thumb in enumerate(thumbnails):
+        otsu, _ = cv2.threshold(thumb, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        _, thresh[k, :thumb.shape[0]] = cv2.threshold(
+            thumb, min(otsu, OTSU_MAX_THRESHOLD), 255, cv2.THRESH_BINARY_INV
+        )
+
+    # O OpenCV libera o GIL, então a morfologia de cada página roda em paralelo
+    with ThreadPoolExecutor() as executor:
+        detected_lines = np.stack(list(executor.map(_detect_lines, thresh)))
+
+    # A imagem binária só contém 0 ou 255: somar direto no acumulador inteiro
+    # evita criar uma máscara booleana intermediária do tamanho do lote.
+    line_pixels = detected_lines.sum(axis=(1, 2), dtype=np.int64) // 255
+    total_pixels = heights * DETECTION_WIDTH
+    return [bool(ratio > 0.01) for ratio in line_pixels / total_pixels]
+
+def is_sheet_music(image):
+    """
+    Verifica se a imagem (em tons de cinza) possui características de partitura,
+    detectando pautas através da análise de linhas horizontais.
+    """
+    return detect_sheet_music([image])[0]
+
+def detect_pdf_pages(pdf):
+    """
+    Passada de detecção sobre um PdfDocument: renderiza cada página em baixa
+    resolução (DETECTION_DPI), suficiente para detectar as pautas, e retorna,
+    para cada página, se ela contém partitura.
+    """
+    previews = [render_page(pdf[i], dpi=DETECTION_DPI) for i in range(len(pdf))]
+    return detect_sheet_music(previews)
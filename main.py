@@ -2,25 +2,61 @@
 # -*- coding: utf-8 -*-
 
 import os
+import errno
+import hashlib
 import cv2
 import numpy as np
 import subprocess
-from pdf2image import convert_from_path
+import pypdfium2 as pdfium
 import pyttsx3
-from pydub import AudioSegment
-from music21 import converter, midi, meter
+import fluidsynth
+import mido
+import soundfile as sf
+from scipy.signal import resample_poly
+from music21 import converter, key, midi, meter, tempo
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
+import tempfile
+import threading
 import uuid
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from detection import OMR_DPI, detect_pdf_pages, render_page
 
 # Configurações via variável de ambiente
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")  # ex.: "http://example.com,http://localhost:3000"
 SOUNDFONT_PATH = os.getenv("SOUNDFONT_PATH", "soundfont.sf2")
 
+# Arquivos temporários das páginas ficam em memória (tmpfs) quando disponível.
+# TEMP_ROOT vazio usa o diretório temporário padrão do sistema.
+TEMP_ROOT = os.getenv("TEMP_ROOT", "/dev/shm" if os.path.isdir("/dev/shm") else "") or None
+# Espaço livre mínimo (em MB) em TEMP_ROOT para iniciar uma página nele
+TEMP_MIN_FREE_MB = int(os.getenv("TEMP_MIN_FREE_MB", 256))
+
+# Parâmetros da síntese de áudio (22,05 kHz mono basta para narração e piano MIDI)
+SAMPLE_RATE = 22050
+RELEASE_SECONDS = 1.0
+
+# Número de processos que processam páginas em paralelo; cada um mantém seu
+# próprio sintetizador e executa sua própria instância do Audiveris
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", os.cpu_count() or 1))
+
+# Pool de processos das páginas, criado sob demanda e reaproveitado entre requisições
+_page_executor = None
+
+# Sintetizadores FluidSynth já carregados neste processo (e o id do SoundFont), por SoundFont
+_SYNTHS = {}
+
+# Motor de narração reaproveitado entre as páginas e a thread que o utiliza
+_tts_engine = None
+_TTS_LOCK = threading.Lock()
+_TTS_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
 app = FastAPI(
     title="Audiobook de Partituras",
     description="API para converter partituras em audiolivros narrados, acessível para deficientes visuais."
@@ -38,22 +74,35 @@ app.add_middleware(
 OUTPUT_DIR = "output_audio"
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
+
+# Cache das narrações já sintetizadas, indexado pelo hash do texto narrado.
+# Fica fora de OUTPUT_DIR para não ser publicado em /audiobooks.
+NARRATION_CACHE_DIR = os.getenv("NARRATION_CACHE_DIR", "narration_cache")
+if not os.path.exists(NARRATION_CACHE_DIR):
+    os.makedirs(NARRATION_CACHE_DIR)
     
 # Disponibiliza os arquivos gerados via URL
 app.mount("/audiobooks", StaticFiles(directory=OUTPUT_DIR), name="audiobooks")
 
-def is_sheet_music(image):
+def _key_from_signature(score, ks):
     """
-    Verifica se a imagem possui características de partitura,
-    detectando pautas através da análise de linhas horizontais.
+    Define o modo de uma armadura sem modo declarado (<key> sem <mode>),
+    comparando a última nota do baixo com as tônicas maior e menor possíveis.
+    Se a comparação não for conclusiva, recorre à análise da partitura.
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
-    detected_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    line_pixels = cv2.countNonZero(detected_lines)
-    total_pixels = image.shape[0] * image.shape[1]
-    return line_pixels / total_pixels > 0.01
+    major = ks.asKey('major')
+    minor = ks.asKey('minor')
+    # converter.parse pode retornar um Stream sem partes (sem o atributo parts)
+    parts = getattr(score, 'parts', None)
+    bass_part = parts[-1] if parts else score
+    last = bass_part.recurse().getElementsByClass(['Note', 'Chord']).last()
+    if last is not None:
+        bass = last.bass() if last.isChord else last.pitch
+        if bass.pitchClass == minor.tonic.pitchClass:
+            return minor
+        if bass.pitchClass == major.tonic.pitchClass:
+            return major
+    return score.analyze('key')
 
 def generate_narration_text(score, title):
     """
@@ -61,48 +110,189 @@ def generate_narration_text(score, title):
     de narração com detalhes sobre a peça.
     """
     narration = f"A seguir, você ouvirá a peça {title}. "
-    # Extrair tonalidade
+
+    # Localiza a primeira armadura de clave, o primeiro compasso e a primeira
+    # marca de metrônomo em uma única travessia da partitura
+    ks = None
+    ts = None
+    mm = None
     try:
-        analyzed_key = score.analyze('key')
-        narration += f"Esta peça está na tonalidade de {analyzed_key.tonic.name} {analyzed_key.mode}. "
+        for el in score.recurse(classFilter=(key.KeySignature, meter.TimeSignature, tempo.MetronomeMark)):
+            if ks is None and isinstance(el, key.KeySignature):
+                ks = el
+            elif ts is None and isinstance(el, meter.TimeSignature):
+                ts = el
+            elif mm is None and isinstance(el, tempo.MetronomeMark):
+                mm = el
+            if ks is not None and ts is not None and mm is not None:
+                break
     except Exception:
-        narration += "A tonalidade da peça não pôde ser determinada. "
-    
-    # Extrair compasso
+        pass
+
+    # Extrair tonalidade: usa a armadura declarada no MusicXML e só recorre à
+    # análise se não houver
     try:
-        ts = score.recurse().getElementsByClass(meter.TimeSignature)
-        if ts:
-            narration += f"O compasso é {ts[0].ratioString}. "
+        if isinstance(ks, key.Key):
+            analyzed_key = ks
+        elif ks is not None:
+            analyzed_key = _key_from_signature(score, ks)
         else:
-            narration += "O compasso não foi identificado. "
+            analyzed_key = score.analyze('key')
+        narration += f"Esta peça está na tonalidade de {analyzed_key.tonic.name} {analyzed_key.mode}. "
     except Exception:
+        narration += "A tonalidade da peça não pôde ser determinada. "
+
+    # Extrair compasso
+    if ts is not None:
+        narration += f"O compasso é {ts.ratioString}. "
+    else:
         narration += "O compasso não foi identificado. "
     
     # Extrair andamento (bpm) via metronome marks
-    try:
-        tempo = None
-        for mm in score.recurse().getElementsByClass('MetronomeMark'):
-            tempo = mm.number
-            break
-        if tempo:
-            narration += f"O andamento é de {tempo} batidas por minuto. "
-        else:
-            narration += "O andamento não foi identificado. "
-    except Exception:
+    if mm is not None and mm.number:
+        narration += f"O andamento é de {mm.number} batidas por minuto. "
+    else:
         narration += "O andamento não foi identificado. "
     
     narration += "Ouça atentamente e observe os detalhes para aprender a tocar esta música."
     return narration
 
+def _get_tts_engine():
+    """
+    Retorna o motor pyttsx3 do processo atual, inicializando-o apenas uma vez.
+    """
+    global _tts_engine
+    if _tts_engine is None:
+        _tts_engine = pyttsx3.init()
+        _tts_engine.setProperty("rate", 150)
+    return _tts_engine
+
+def _save_narration(narration_text, narration_file):
+    # O pyttsx3 não é thread-safe, então o acesso ao motor é serializado
+    with _TTS_LOCK:
+        engine = _get_tts_engine()
+        engine.save_to_file(narration_text, narration_file)
+        engine.runAndWait()
+
+    # Converte a saída do pyttsx3 uma única vez para o formato final (mono, SAMPLE_RATE)
+    narration, rate = sf.read(narration_file, dtype="int16", always_2d=True)
+    narration = narration.mean(axis=1)
+    if rate != SAMPLE_RATE:
+        narration = resample_poly(narration, SAMPLE_RATE, rate)
+    narration = np.clip(narration, -32768, 32767).astype(np.int16)
+    sf.write(narration_file, narration, SAMPLE_RATE, subtype="PCM_16")
+
 def generate_narration_audio(narration_text, narration_file):
     """
-    Converte o texto de narração em áudio utilizando pyttsx3.
-    Nota: Em ambiente de produção, considere rodar esse processo de forma assíncrona.
+    Converte o texto de narração em áudio utilizando pyttsx3, sem bloquear o chamador.
+    Retorna um Future que é concluído quando o arquivo de narração estiver gravado.
     """
-    engine = pyttsx3.init()
-    engine.setProperty("rate", 150)
-    engine.save_to_file(narration_text, narration_file)
-    engine.runAndWait()
+    return _TTS_EXECUTOR.submit(_save_narration, narration_text, narration_file)
+
+def _reset_channels(fs, sfid):
+    """
+    Restaura o estado inicial de todos os canais: silencia as notas, zera os
+    controladores e volta aos programas padrão do General MIDI.
+    """
+    for channel in range(16):
+        fs.cc(channel, 120, 0)
+        fs.cc(channel, 121, 0)
+        # O canal 10 (índice 9) é reservado à percussão no General MIDI
+        fs.program_select(channel, sfid, 128 if channel == 9 else 0, 0)
+
+def _get_synth(soundfont):
+    """
+    Retorna o sintetizador FluidSynth do processo atual e o id do SoundFont,
+    carregando-o apenas na primeira chamada e reaproveitando-o nas seguintes.
+    """
+    if soundfont not in _SYNTHS:
+        fs = fluidsynth.Synth(samplerate=float(SAMPLE_RATE))
+        sfid = fs.sfload(soundfont)
+        if sfid == -1:
+            raise Exception(f"Não foi possível carregar o SoundFont {soundfont}.")
+        _reset_channels(fs, sfid)
+        _SYNTHS[soundfont] = (fs, sfid)
+    return _SYNTHS[soundfont]
+
+def render_midi_to_wav(midi_file, wav_file, soundfont):
+    """
+    Renderiza um arquivo MIDI em WAV (16 bits, mono) de forma offline,
+    usando o sintetizador persistente do processo.
+    """
+    fs, sfid = _get_synth(soundfont)
+    mid = mido.MidiFile(midi_file)
+    # Buffer de saída pré-alocado com a duração da peça mais o tempo de release
+    total_frames = int((mid.length + RELEASE_SECONDS) * SAMPLE_RATE)
+    audio = np.zeros(total_frames, dtype=np.int16)
+    position = 0
+    elapsed = 0.0
+
+    def render_until(frame):
+        nonlocal position
+        frame = min(frame, total_frames)
+        if frame > position:
+            # O FluidSynth gera estéreo intercalado; os canais são somados em mono
+            audio[position:frame] = fs.get_samples(frame - position).reshape(-1, 2).mean(axis=1)
+            position = frame
+
+    try:
+        for msg in mid:
+            elapsed += msg.time
+            render_until(int(elapsed * SAMPLE_RATE))
+            if msg.type == "note_on":
+                fs.noteon(msg.channel, msg.note, msg.velocity)
+            elif msg.type == "note_off":
+                fs.noteoff(msg.channel, msg.note)
+            elif msg.type == "program_change":
+                fs.program_change(msg.channel, msg.program)
+            elif msg.type == "control_change":
+                fs.cc(msg.channel, msg.control, msg.value)
+            elif msg.type == "pitchwheel":
+                fs.pitch_bend(msg.channel, msg.pitch)
+        render_until(total_frames)
+    finally:
+        # Restaura os canais para que a próxima página comece limpa, sem herdar
+        # os instrumentos escolhidos por esta
+        _reset_channels(fs, sfid)
+
+    sf.write(wav_file, audio, SAMPLE_RATE, subtype="PCM_16")
+
+def mix_narration(narration_file, piece_file, output_file, pause_seconds=1.0):
+    """
+    Combina a narração, uma pausa e o áudio da peça em um único WAV de 16 bits,
+    concatenando as amostras diretamente com NumPy.
+    """
+    narration, narration_rate = sf.read(narration_file, dtype="int16", always_2d=True)
+    piece, rate = sf.read(piece_file, dtype="int16", always_2d=True)
+    # A narração é reamostrada apenas se a taxa diferir da peça
+    if narration_rate != rate:
+        narration = resample_poly(narration, rate, narration_rate, axis=0)
+        narration = np.clip(narration, -32768, 32767).astype(np.int16)
+    # Ajusta o número de canais da narração (normalmente mono) ao da peça
+    if narration.shape[1] != piece.shape[1]:
+        narration = np.repeat(narration.mean(axis=1, keepdims=True), piece.shape[1], axis=1).astype(np.int16)
+    pause = np.zeros((int(rate * pause_seconds), piece.shape[1]), dtype=np.int16)
+    final_audio = np.concatenate([narration, pause, piece])
+    # O cabeçalho PCM é gravado pelo módulo wave da biblioteca padrão
+    with wave.open(output_file, "wb") as w:
+        w.setnchannels(final_audio.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(final_audio.tobytes())
+
+def publish_file(source_file, dest_file):
+    """
+    Copia source_file para dest_file de forma atômica: a cópia é gravada com um
+    nome único no diretório de destino e então renomeada, para que leitores e
+    outros processos nunca vejam um arquivo parcialmente escrito.
+    """
+    temp_file = f"{dest_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(source_file, temp_file)
+        os.replace(temp_file, dest_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
 def find_musicxml_file(base_path):
     """
@@ -117,105 +307,261 @@ def find_musicxml_file(base_path):
         return possible_mxl
     return None
 
-def process_pdf(pdf_path, output_dir=OUTPUT_DIR):
+class _WorkdirFullError(Exception):
+    """
+    Falta de espaço ao gravar no diretório de trabalho da página. Apenas esse
+    erro faz _process_page refazer a página em outro diretório; falhas ao publicar
+    em output_dir ou no cache de narrações não são afetadas pelo TEMP_ROOT.
+    """
+
+def _has_free_space(path):
+    """
+    Verifica se path tem ao menos TEMP_MIN_FREE_MB livres.
     """
-    Processa o PDF de partituras:
-      - Converte cada página em imagem.
-      - Identifica páginas com partitura.
+    try:
+        return shutil.disk_usage(path).free >= TEMP_MIN_FREE_MB * 1024 * 1024
+    except OSError:
+        return False
+
+def _temp_root():
+    """
+    Retorna o diretório base dos arquivos temporários das páginas: TEMP_ROOT,
+    se houver espaço livre suficiente, ou None (diretório temporário padrão).
+    """
+    if TEMP_ROOT is not None and _has_free_space(TEMP_ROOT):
+        return TEMP_ROOT
+    return None
+
+def _write_in_workdir(write, *args):
+    """
+    Executa uma gravação no diretório de trabalho, convertendo a falta de
+    espaço (ENOSPC) em _WorkdirFullError.
+    """
+    try:
+        return write(*args)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise _WorkdirFullError(str(e)) from e
+        raise
+
+def _write_png(filename, image):
+    """
+    Grava a imagem em PNG. Codifica em memória e grava com open(), para que
+    falhas de gravação (como falta de espaço) gerem OSError em vez de um retorno False.
+    """
+    _, png = cv2.imencode(".png", image)
+    with open(filename, "wb") as f:
+        f.write(png.tobytes())
+
+def _write_midi(score, midi_file):
+    """
+    Converte a partitura do music21 em um arquivo MIDI.
+    """
+    mf = midi.translate.music21ObjectToMidiFile(score)
+    mf.open(midi_file, 'wb')
+    try:
+        mf.write()
+    finally:
+        mf.close()
+
+def _process_page(page_image, index, soundfont, output_dir):
+    """
+    Processa uma única página de partitura (imagem em tons de cinza) de forma
+    isolada, para que possa ser executada em um processo separado.
+    Retorna uma tupla (título, filename) ou None se a página não gerar áudio.
+    """
+    # Diretório temporário exclusivo da página, removido por completo ao final.
+    # Se o TEMP_ROOT (tipicamente um tmpfs pequeno) encher durante o processamento,
+    # a página é refeita no diretório temporário padrão.
+    temp_root = _temp_root()
+    while True:
+        try:
+            with tempfile.TemporaryDirectory(dir=temp_root) as workdir:
+                return _process_page_in(workdir, page_image, index, soundfont, output_dir)
+        except _WorkdirFullError as e:
+            if temp_root is None:
+                print(f"Sem espaço para processar a página {index}: {e}")
+                return None
+            print(f"Sem espaço em {temp_root}; processando a página {index} no diretório temporário padrão.")
+            temp_root = None
+
+def _process_page_in(workdir, page_image, index, soundfont, output_dir):
+    """
+    Executa o processamento de uma página dentro do diretório de trabalho workdir.
+    A falta de espaço em workdir é propagada como _WorkdirFullError, para que
+    _process_page possa refazer a página em outro diretório.
+    """
+    # O Audiveris exige um arquivo, então o PNG só é gravado neste ponto. O nome
+    # base é único, pois o Audiveris o usa como título quando a partitura não tem um.
+    image_stem = f"page_{uuid.uuid4().hex}_{index}"
+    image_filename = os.path.join(workdir, f"{image_stem}.png")
+    _write_in_workdir(_write_png, image_filename, page_image)
+    # Chama o Audiveris para gerar o MusicXML (certifique-se de que o Audiveris esteja instalado e no PATH)
+    # Usando o nome base da imagem para que o arquivo de saída possua o mesmo nome base.
+    base_name, _ = os.path.splitext(image_filename)
+    cmd = ["audiveris", "-batch", "-export", "-output", workdir, image_filename]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except subprocess.CalledProcessError as err:
+        # O Audiveris não informa o motivo da falha: se o diretório de trabalho
+        # ficou sem espaço livre, ela é tratada como falta de espaço
+        if not _has_free_space(workdir):
+            raise _WorkdirFullError(f"Audiveris falhou sem espaço livre em {workdir}") from err
+        print(f"Erro na execução do Audiveris na página {index}: {err}")
+        return None
+    except OSError as err:
+        print(f"Erro na execução do Audiveris na página {index}: {err}")
+        return None
+
+    musicxml_file = find_musicxml_file(base_name)
+    if musicxml_file is None:
+        print(f"Arquivo MusicXML não gerado para a página {index}.")
+        return None
+
+    try:
+        score = converter.parse(musicxml_file)
+        # Define o título usando metadados, ou gera um nome padrão se não houver.
+        # O Audiveris usa o nome base da imagem como título quando a partitura
+        # não declara um, e esse título não é considerado.
+        metadata_title = score.metadata.title if score.metadata is not None else None
+        has_title = bool(metadata_title) and metadata_title != image_stem
+        if has_title:
+            title = metadata_title.strip().replace(" ", "_")
+        else:
+            title = f"Partitura_{uuid.uuid4().hex}_{index}"
+
+        # Gera a narração em segundo plano, sobrepondo-a à síntese da peça.
+        # Narrações idênticas (mesmo título, tonalidade, compasso e andamento)
+        # são reaproveitadas do cache em vez de sintetizadas novamente; páginas
+        # sem título têm nome único e por isso não passam pelo cache.
+        narration_text = generate_narration_text(score, title)
+        narration_temp_file = os.path.join(workdir, "narration.wav")
+        narration_cache_file = None
+        if has_title:
+            narration_key = hashlib.blake2b(narration_text.encode("utf-8"), digest_size=8).hexdigest()
+            narration_cache_file = os.path.join(NARRATION_CACHE_DIR, f"{narration_key}.wav")
+        if narration_cache_file is not None and os.path.exists(narration_cache_file):
+            narration_file = narration_cache_file
+            narration_future = None
+        else:
+            narration_file = narration_temp_file
+            narration_future = generate_narration_audio(narration_text, narration_temp_file)
+
+        # A narração grava em workdir: qualquer que seja o desfecho da página, ela
+        # precisa terminar antes que o diretório seja removido
+        try:
+            midi_file = os.path.join(workdir, "page.mid")
+            _write_in_workdir(_write_midi, score, midi_file)
+
+            # Converte MIDI para áudio com FluidSynth
+            piece_audio_file = os.path.join(workdir, "piece.wav")
+            try:
+                _write_in_workdir(render_midi_to_wav, midi_file, piece_audio_file, soundfont)
+            except _WorkdirFullError:
+                raise
+            except Exception as err:
+                print(f"Erro na conversão MIDI para áudio na página {index}: {err}")
+                return None
+
+            # Aguarda a narração antes de combinar os áudios e a guarda no cache,
+            # de forma atômica, pois outros processos podem gravar a mesma narração
+            if narration_future is not None:
+                _write_in_workdir(narration_future.result)
+                if narration_cache_file is not None:
+                    publish_file(narration_temp_file, narration_cache_file)
+            # Páginas com o mesmo título são processadas ao mesmo tempo: o áudio final
+            # é montado no diretório da página e publicado de forma atômica.
+            final_audio_filename = f"{title}_narrado.wav"
+            final_audio_file = os.path.join(output_dir, final_audio_filename)
+            final_temp_file = os.path.join(workdir, "final.wav")
+            _write_in_workdir(mix_narration, narration_file, piece_audio_file, final_temp_file)
+            publish_file(final_temp_file, final_audio_file)
+            print(f"Audiobook narrado salvo: {final_audio_file}")
+            return title, final_audio_filename
+        finally:
+            if narration_future is not None:
+                wait([narration_future])
+    except _WorkdirFullError:
+        raise
+    except Exception as e:
+        print(f"Erro ao processar a página {index}: {e}")
+        return None
+
+def _init_worker(soundfont):
+    """
+    Inicializa um processo do pool, carregando o SoundFont uma única vez para
+    todas as páginas (e requisições) que ele vier a processar.
+    """
+    if os.path.exists(soundfont):
+        try:
+            _get_synth(soundfont)
+        except Exception as e:
+            print(f"Erro ao carregar o SoundFont {soundfont}: {e}")
+
+def _get_page_executor():
+    """
+    Retorna o pool de processos compartilhado entre as requisições, criando-o
+    na primeira chamada (ou novamente, caso um worker tenha morrido).
+    """
+    global _page_executor
+    if _page_executor is None:
+        _page_executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            initializer=_init_worker,
+            initargs=(SOUNDFONT_PATH,),
+        )
+    return _page_executor
+
+def process_pdf(pdf_source, output_dir=OUTPUT_DIR):
+    """
+    Processa o PDF de partituras (caminho do arquivo ou conteúdo em bytes):
+      - Renderiza cada página em memória com o PDFium, em baixa resolução.
+      - Identifica páginas com partitura e as renderiza novamente em alta resolução.
       - Invoca o Audiveris para gerar o MusicXML.
       - Converte o MusicXML em MIDI e, em seguida, em áudio usando FluidSynth.
       - Gera uma narração com informações musicais e combina com o áudio da peça.
       - Salva o arquivo final na pasta output_audio.
+    As páginas são processadas em paralelo, no pool de processos compartilhado.
     Retorna um dicionário mapeando o título à filename do áudio final.
     """
+    global _page_executor
     # Verifica se o arquivo soundfont existe
     if not os.path.exists(SOUNDFONT_PATH):
         raise Exception(f"SoundFont não encontrado em {SOUNDFONT_PATH}.")
-        
-    pages = convert_from_path(pdf_path, dpi=200)
+
+    pdf = pdfium.PdfDocument(pdf_source)
     narrated_scores = {}
-    
-    for i, page in enumerate(pages):
-        temp_id = uuid.uuid4().hex
-        image_filename = f"temp_page_{temp_id}_{i}.png"
-        page.save(image_filename, "PNG")
-        img = cv2.imread(image_filename)
-        if is_sheet_music(img):
-            print(f"Página {i} identificada como partitura.")
-            # Chama o Audiveris para gerar o MusicXML (certifique-se de que o Audiveris esteja instalado e no PATH)
-            # Usando o nome base da imagem para que o arquivo de saída possua o mesmo nome base.
-            base_name, _ = os.path.splitext(image_filename)
-            cmd = f"audiveris -batch -export -output . {image_filename}"
-            try:
-                subprocess.run(cmd, shell=True, check=True)
-            except subprocess.CalledProcessError as err:
-                print(f"Erro na execução do Audiveris na página {i}: {err}")
-                os.remove(image_filename)
-                continue
-
-            musicxml_file = find_musicxml_file(base_name)
-            if musicxml_file is None:
-                print(f"Arquivo MusicXML não gerado para a página {i}.")
-                os.remove(image_filename)
-                continue
 
-            try:
-                score = converter.parse(musicxml_file)
-                # Define o título usando metadados, ou gera um nome padrão se não houver
-                if score.metadata is not None and score.metadata.title:
-                    title = score.metadata.title.strip().replace(" ", "_")
-                else:
-                    title = f"Partitura_{temp_id}_{i}"
-                
-                midi_file = f"temp_page_{temp_id}_{i}.mid"
-                mf = midi.translate.music21ObjectToMidiFile(score)
-                mf.open(midi_file, 'wb')
-                mf.write()
-                mf.close()
-                
-                # Converte MIDI para áudio com FluidSynth
-                piece_audio_file = f"temp_piece_{temp_id}_{i}.wav"
-                cmd_audio = f"fluidsynth -ni {SOUNDFONT_PATH} {midi_file} -F {piece_audio_file} -r 44100"
-                try:
-                    subprocess.run(cmd_audio, shell=True, check=True)
-                except subprocess.CalledProcessError as err:
-                    print(f"Erro na conversão MIDI para áudio na página {i}: {err}")
-                    os.remove(image_filename)
-                    continue
-                
-                # Gera a narração baseada nos metadados da partitura
-                narration_text = generate_narration_text(score, title)
-                narration_temp_file = f"temp_narration_{temp_id}_{i}.wav"
-                generate_narration_audio(narration_text, narration_temp_file)
-                
-                narration_audio = AudioSegment.from_wav(narration_temp_file)
-                piece_audio = AudioSegment.from_wav(piece_audio_file)
-                pause = AudioSegment.silent(duration=1000)  # 1 segundo de pausa
-                final_audio = narration_audio + pause + piece_audio
-                
-                final_audio_filename = f"{title}_narrado.wav"
-                final_audio_file = os.path.join(output_dir, final_audio_filename)
-                final_audio.export(final_audio_file, format="wav")
-                narrated_scores[title] = final_audio_filename
-                print(f"Audiobook narrado salvo: {final_audio_file}")
-            except Exception as e:
-                print(f"Erro ao processar a página {i}: {e}")
-        else:
-            print(f"Página {i} não contém partitura.")
-        
-        # Remove arquivos temporários (se existirem)
-        temp_files = [
-            image_filename,
-            f"temp_page_{temp_id}_{i}.xml",
-            f"temp_page_{temp_id}_{i}.mxl",
-            f"temp_page_{temp_id}_{i}.mid",
-            f"temp_piece_{temp_id}_{i}.wav",
-            f"temp_narration_{temp_id}_{i}.wav"
-        ]
-        for f in temp_files:
-            if os.path.exists(f):
-                os.remove(f)
-    
+    executor = _get_page_executor()
+    futures = {}
+    try:
+        for i, is_score in enumerate(detect_pdf_pages(pdf)):
+            if is_score:
+                print(f"Página {i} identificada como partitura.")
+                # Apenas as páginas aceitas são renderizadas na resolução do Audiveris
+                page_image = render_page(pdf[i], dpi=OMR_DPI)
+                futures[executor.submit(_process_page, page_image, i, SOUNDFONT_PATH, output_dir)] = i
+            else:
+                print(f"Página {i} não contém partitura.")
+    finally:
+        pdf.close()
+
+    for future in as_completed(futures):
+        # Uma falha inesperada em uma página não descarta o resultado das demais
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # O pool não aceita novas tarefas; será recriado na próxima requisição
+            print(f"Erro ao processar a página {futures[future]}: {e}")
+            _page_executor = None
+            continue
+        except Exception as e:
+            print(f"Erro ao processar a página {futures[future]}: {e}")
+            continue
+        if result is not None:
+            title, filename = result
+            narrated_scores[title] = filename
+
     return narrated_scores
 
 @app.get("/")
@@ -231,12 +577,10 @@ async def process_file(file: UploadFile = File(...)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="O arquivo enviado deve ser um PDF.")
     
-    temp_pdf_path = f"temp_{uuid.uuid4().hex}.pdf"
     try:
-        with open(temp_pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        narrated_scores = process_pdf(temp_pdf_path)
+        # O PDF é lido em memória e entregue diretamente ao PDFium, sem arquivo temporário
+        data = await file.read()
+        narrated_scores = process_pdf(data)
         response_data = []
         for title, filename in narrated_scores.items():
             response_data.append({
@@ -246,9 +590,6 @@ async def process_file(file: UploadFile = File(...)):
         return JSONResponse(content={"audiobooks": response_data})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar o arquivo: {e}")
-    finally:
-        if os.path.exists(temp_pdf_path):
-            os.remove(temp_pdf_path)
 
 @app.get("/audiobooks")
 def list_audiobooks():
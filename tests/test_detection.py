@@ -0,0 +1,172 @@
+import random
+
+import cv2
+import numpy as np
+import pypdfium2 as pdfium
+
+from detection import DETECTION_DPI, detect_pdf_pages, detect_sheet_music, is_sheet_music, render_page
+
+# As páginas são desenhadas em alta resolução e reduzidas para DETECTION_DPI,
+# reproduzindo o antisserrilhamento da renderização do PDFium.
+DRAW_DPI = 600
+
+
+def _mm(value):
+    return int(round(value / 25.4 * DRAW_DPI))
+
+
+def _blank_page():
+    return np.full((int(11 * DRAW_DPI), int(8.5 * DRAW_DPI)), 255, dtype=np.uint8)
+
+
+def _render(page):
+    h, w = page.shape
+    size = (int(w * DETECTION_DPI / DRAW_DPI), int(h * DETECTION_DPI / DRAW_DPI))
+    return cv2.resize(page, size, interpolation=cv2.INTER_AREA)
+
+
+def _score_page(staves=10, line_mm=0.13, spacing_mm=1.75):
+    """Página carta com pautas finas, cabeças de nota e hastes."""
+    rng = random.Random(staves)
+    page = _blank_page()
+    left, right = _mm(15), page.shape[1] - _mm(15)
+    gap = (page.shape[0] - 2 * _mm(25)) / staves
+    thickness = max(1, _mm(line_mm))
+    for s in range(staves):
+        top = _mm(25) + int(s * gap)
+        for line in range(5):
+            y = top + line * _mm(spacing_mm)
+            page[y:y + thickness, left:right] = 0
+        for _ in range(30):
+            x = rng.randint(left + _mm(10), right - _mm(5))
+            y = top + rng.randint(0, 8) * _mm(spacing_mm) // 2
+            cv2.ellipse(page, (x, y), (_mm(1.0), _mm(0.75)), -20, 0, 360, 0, -1)
+            cv2.line(page, (x + _mm(1.0), y), (x + _mm(1.0), y - _mm(6)), 0, thickness)
+    return _render(page)
+
+
+def _text_page():
+    """Página carta com parágrafos de texto corrido."""
+    rng = random.Random(0)
+    page = _blank_page()
+    y = _mm(25)
+    while y < page.shape[0] - _mm(25):
+        x = _mm(25)
+        while True:
+            word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+            (width, _), _ = cv2.getTextSize(word, cv2.FONT_HERSHEY_SIMPLEX, 2.2, 4)
+            if x + width > page.shape[1] - _mm(25):
+                break
+            cv2.putText(page, word, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 2.2, 0, 4, cv2.LINE_AA)
+            x += width + _mm(1.7)
+        y += _mm(5.5)
+    return _render(page)
+
+
+def test_score_page_is_detected():
+    for staves in (8, 10, 12):
+        assert is_sheet_music(_score_page(staves=staves))
+
+
+def test_text_page_is_rejected():
+    assert not is_sheet_music(_text_page())
+
+
+def _gradient_page(noise=0):
+    """Página sem conteúdo com fundo em degradê vertical (235 -> 250)."""
+    h, w = _render(_blank_page()).shape
+    page = np.tile(np.linspace(235, 250, h)[:, None], (1, w))
+    if noise:
+        page += np.random.default_rng(0).integers(-noise, noise + 1, page.shape)
+    return np.clip(page, 0, 255).astype(np.uint8)
+
+
+def _shaded_header_page():
+    """Capa em branco com uma faixa de cabeçalho cinza-claro (200)."""
+    page = _render(_blank_page())
+    page[: page.shape[0] // 6] = 200
+    return page
+
+
+def test_low_contrast_pages_are_rejected():
+    blank = _render(_blank_page())
+    pages = [blank, _gradient_page(), _gradient_page(noise=3), _shaded_header_page()]
+    assert detect_sheet_music(pages) == [False, False, False, False]
+
+
+def test_batch_matches_pages():
+    pages = [_score_page(), _text_page(), _score_page(staves=8, line_mm=0.18)]
+    assert detect_sheet_music(pages) == [True, False, True]
+
+
+def _make_pdf(contents):
+    """Monta um PDF mínimo (carta, Helvetica) com um content stream por página."""
+    count = len(contents)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * k) for k in range(count)) + b"] /Count %d >>" % count,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for k, content in enumerate(contents):
+        stream = content.encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * k)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return data
+
+
+def _pdf_score_content(staves=10, line_pt=0.37, spacing_pt=5.0):
+    """Pautas de linhas finas (0,13 mm) com cabeças de nota, em coordenadas PDF."""
+    rng = random.Random(staves)
+    ops = []
+    gap = (792 - 2 * 72) / staves
+    for s in range(staves):
+        top = 792 - 72 - s * gap
+        for line in range(5):
+            ops.append(f"42 {top - line * spacing_pt:.2f} 528 {line_pt} re f")
+        for _ in range(30):
+            x = rng.uniform(60, 560)
+            y = top - rng.randint(0, 8) * spacing_pt / 2
+            ops.append(f"{x:.2f} {y - 2:.2f} 5.5 4 re f")
+    return "\n".join(ops)
+
+
+def _pdf_text_content():
+    rng = random.Random(0)
+    lines = []
+    for _ in range(55):
+        words = ("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))) for _ in range(14))
+        lines.append(f"({' '.join(words)}) Tj T*")
+    return "BT /F1 10 Tf 12 TL 72 730 Td\n" + "\n".join(lines) + "\nET"
+
+
+def test_render_page_returns_grayscale():
+    pdf = pdfium.PdfDocument(_make_pdf([_pdf_score_content()]))
+    try:
+        image = render_page(pdf[0], dpi=DETECTION_DPI)
+    finally:
+        pdf.close()
+    assert image.dtype == np.uint8
+    # O PDFium arredonda as dimensões para cima
+    height, width = image.shape
+    assert abs(height - 792 * DETECTION_DPI / 72) <= 1
+    assert abs(width - 612 * DETECTION_DPI / 72) <= 1
+
+
+def test_detection_pass_on_pdf():
+    pdf = pdfium.PdfDocument(_make_pdf([_pdf_text_content(), _pdf_score_content(), _pdf_score_content(staves=8)]))
+    try:
+        assert detect_pdf_pages(pdf) == [False, True, True]
+    finally:
+        pdf.close()